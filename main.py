@@ -10,20 +10,126 @@ from src.ModelInfo import ModelInfo
 from src.ModelDownloader import ModelDownloader
 from src.HtxRequest import HtxRequest
 from src.CliHelpers import CliHelpers
+from src.Profiler import PROFILER
+
+
+def print_job(job: dict):
+    """Print one daemon job on a single line"""
+    line = f"{job['job_id']}  {job['status']:<8} {job['name'] or job['url']}"
+    if job.get("path"):
+        line += f" -> {job['path']}"
+    if job.get("error"):
+        line += f" ({job['error']})"
+    print(line)
+
+
+def run_client(args) -> int:
+    """Send --submit/--status/--jobs to a running daemon"""
+    # imported here, the daemon needs unix sockets and plain downloads shouldn't
+    try:
+        from src.DownloadDaemon import DaemonClient
+    except ImportError as e:
+        print(f"Error: {e}")
+        return 1
+    client = DaemonClient(args.socket)
+    try:
+        if args.jobs:
+            for job in client.list_jobs()["jobs"]:
+                print_job(job)
+            return 0
+
+        if args.status:
+            response = client.wait(args.status) if args.wait else client.status(args.status)
+            if not response["ok"]:
+                print(f"Error: {response['error']}")
+                return 1
+            print_job(response)
+            return 0 if response["status"] != "failed" else 1
+
+        job_ids = []
+        for url in args.submit:
+            response = client.submit(url, folder=args.folder, allow_unsafe=args.allow_unsafe)
+            if not response["ok"]:
+                print(f"Error submitting {url}: {response['error']}")
+                continue
+            job_ids.append(response["job_id"])
+            print_job(response)
+
+        if not args.wait:
+            return 0 if len(job_ids) == len(args.submit) else 1
+
+        failed = len(args.submit) - len(job_ids)
+        for job_id in job_ids:
+            response = client.wait(job_id)
+            print_job(response)
+            if response["status"] == "failed":
+                failed += 1
+        return 0 if failed == 0 else 1
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"No daemon listening on {args.socket}. Start one with --daemon")
+        return 1
 
 def main():
-    """Main CLI application loop"""
+    """Parse args and run, under the profiler when --profile is given"""
     cli = CliHelpers()
     args = cli.main_args()
     
+    if not args.profile:
+        return run(cli, args)
+    
+    PROFILER.start(args.profile, cprofile=args.profile_cprofile, trace_memory=args.profile_tracemalloc)
     try:
-        config_path = Path(__file__).parent / "config.toml"
-        downloader = ModelDownloader(str(config_path))
-        htx = HtxRequest(os.getenv("API_KEY"))
+        return run(cli, args)
+    finally:
+        PROFILER.stop()
+
+def run(cli: CliHelpers, args):
+    """Main CLI application loop"""
+    # client calls skip all the setup, the daemon already has it
+    if args.submit or args.status or args.jobs:
+        return run_client(args)
+    
+    try:
+        with PROFILER.span("setup"):
+            config_path = Path(__file__).parent / "config.toml"
+            downloader = ModelDownloader(str(config_path))
+            htx = HtxRequest(os.getenv("API_KEY"))
     except Exception as e:
         print(f"Error initializing components: {e}")
         return 1
     
+    if args.daemon:
+        try:
+            from src.DownloadDaemon import DownloadDaemon
+        except ImportError as e:
+            print(f"Error: {e}")
+            return 1
+        try:
+            DownloadDaemon(downloader, htx, args.socket).serve_forever()
+        except KeyboardInterrupt:
+            print("\nDaemon stopped")
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            return 1
+        return 0
+    
+    if args.enforce_quotas:
+        if not downloader.disk.quotas:
+            print("No quotas set in the [Quota] section of config.toml")
+            return 0
+        downloader.enforce_quotas(dry_run=args.dry_run)
+        return 0
+    
+    if args.catalog:
+        # export listing, no downloads
+        try:
+            count = htx.export_catalog(str(args.catalog), types=args.type, tag=args.tag, username=args.creator)
+            print(f"Exported {count} models to {args.catalog}")
+        except Exception as e:
+            print(f"Error exporting catalog to {args.catalog}: {e}")
+            return 1
+        return 0
+    
     models_to_download = []
     
     if args.model:
@@ -31,9 +137,9 @@ def main():
             # multiple models
             for model_url in args.model:
                 try:
-                    model_id = htx.parse_url(model_url)
-                    model_data = htx.get_model(str(model_id))
-                    model_info = ModelInfo(model_data)
+                    model_data = htx.get_model_by_url(model_url)
+                    with PROFILER.span("model_info"):
+                        model_info = ModelInfo(model_data)
                     models_to_download.append(model_info)
                     print(f"Added model: {model_info.name}")
                 except Exception as e:
@@ -42,21 +148,35 @@ def main():
         else:
             # single model
             try:
-                model_id = htx.parse_url(args.model)
-                model_data = htx.get_model(str(model_id))
-                model_info = ModelInfo(model_data)
+                model_data = htx.get_model_by_url(args.model)
+                with PROFILER.span("model_info"):
+                    model_info = ModelInfo(model_data)
                 models_to_download.append(model_info)
                 print(f"Added model: {model_info.name}")
             except Exception as e:
                 print(f"Error getting model from URL {args.model}: {e}")
                 return 1
     
+    elif args.hash:
+        # resolve versions by file hash
+        for file_hash in args.hash:
+            try:
+                model_data = htx.get_model_by_hash(file_hash)
+                with PROFILER.span("model_info"):
+                    model_info = ModelInfo(model_data)
+                models_to_download.append(model_info)
+                print(f"Added model: {model_info.name}")
+            except Exception as e:
+                print(f"Error getting model for hash {file_hash}: {e}")
+                continue
+    
     elif args.file:
         # batch download from file
         try:
             model_data_list = htx.get_models_by_list_file(args.file)
             for model_data in model_data_list:
-                model_info = ModelInfo(model_data)
+                with PROFILER.span("model_info"):
+                    model_info = ModelInfo(model_data)
                 models_to_download.append(model_info)
                 print(f"Added model: {model_info.name}")
         except Exception as e:
@@ -72,9 +192,9 @@ def main():
                 break
             
             try:
-                model_id = htx.parse_url(url)
-                model_data = htx.get_model(str(model_id))
-                model_info = ModelInfo(model_data)
+                model_data = htx.get_model_by_url(url)
+                with PROFILER.span("model_info"):
+                    model_info = ModelInfo(model_data)
                 models_to_download.append(model_info)
                 print(f"Added model: {model_info.name}")
             except Exception as e:
@@ -87,7 +207,7 @@ def main():
     
     print(f"\nTotal models to process: {len(models_to_download)}")
     
-    if args.file or (args.model and isinstance(args.model, list) and len(args.model) > 1):
+    if args.file or (args.model and isinstance(args.model, list) and len(args.model) > 1) or (args.hash and len(args.hash) > 1):
         if not args.mode:
             print("Error: --mode is required when reading from file or specifying multiple models")
             print("Use --mode concurrent or --mode iterative (or --mode c / --mode i)")
@@ -13,14 +13,39 @@ class CliHelpers:
         model_group = parser.add_mutually_exclusive_group()
         model_group.add_argument("--model", type=str, help="Model url(s)", nargs="*")
         model_group.add_argument("--file", type=str, help="path of file with model urls", nargs='?', const=Path(__file__).resolve().parent.parent / "models.txt", default=None)
+        model_group.add_argument("--hash", type=str, help="Model file hash(es), resolves the matching version directly", nargs="*")
+        model_group.add_argument("--daemon", action="store_true", help="run as a long lived download daemon listening on --socket")
+        model_group.add_argument("--submit", type=str, help="Model url(s) to hand to a running daemon", nargs="+")
+        model_group.add_argument("--status", type=str, help="print the status of a daemon job", metavar="JOB_ID")
+        model_group.add_argument("--jobs", action="store_true", help="list all jobs known to the daemon")
+        model_group.add_argument("--enforce-quotas", action="store_true", help="evict least recently used models from folders over their [Quota] limit")
+        model_group.add_argument("--catalog", type=str, help="export the model listing to a jsonl file instead of downloading", nargs='?', const=Path(__file__).resolve().parent.parent / "catalog.jsonl", default=None)
         
         parser.add_argument("--mode", type=str, help="download mode", required=False, default="concurrent", choices=["concurrent", "iterative", "c", "i"])
         parser.add_argument("--list-versions", action="store_true", help="list all versions of models and choose which one to download when prompted")
         
+        parser.add_argument("--dry-run", action="store_true", help="with --enforce-quotas, only report what would be evicted")
+        
+        # profiling
+        parser.add_argument("--profile", type=str, help="time each pipeline phase and write the breakdown to this directory", nargs='?', const=Path(__file__).resolve().parent.parent / "profile", default=None)
+        parser.add_argument("--profile-cprofile", action="store_true", help="with --profile, also capture a cProfile dump (cprofile.prof)")
+        parser.add_argument("--profile-tracemalloc", action="store_true", help="with --profile, also capture a tracemalloc snapshot (tracemalloc.snapshot)")
+        
+        # daemon options
+        parser.add_argument("--socket", type=str, help="daemon socket path", default=str(Path(__file__).resolve().parent.parent / "modelgrab.sock"))
+        parser.add_argument("--wait", action="store_true", help="with --submit/--status, block until the job(s) finish")
+        parser.add_argument("--folder", type=str, help="with --submit, force the download folder (loras, temp, ...)", default=None)
+        parser.add_argument("--allow-unsafe", action="store_true", help="with --submit, download even if the virus scan didn't pass")
+        
+        # catalog filters
+        parser.add_argument("--type", type=str, help="catalog filter: model type (Checkpoint, LORA, ...)", default=None)
+        parser.add_argument("--tag", type=str, help="catalog filter: tag", default=None)
+        parser.add_argument("--creator", type=str, help="catalog filter: creator username", default=None)
+        
         args = parser.parse_args()
         
-        if not args.model and not args.file:
-            parser.error("Either --model or --file must be specified. Use --help for more information.")
+        if not any([args.model, args.file, args.hash, args.catalog, args.daemon, args.submit, args.status, args.jobs, args.enforce_quotas]):
+            parser.error("Either --model, --file, --hash, --catalog or one of the daemon options must be specified. Use --help for more information.")
         
         return args
 
@@ -0,0 +1,187 @@
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+# only these count toward a quota and get evicted, sidecar yaml/json/previews are left alone
+MODEL_EXTENSIONS = {".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".onnx", ".sft"}
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+
+def parse_size(size) -> int:
+    '''Turn '50GB', '1.5TB', '200M' or a plain number of bytes into bytes'''
+    if isinstance(size, (int, float)):
+        return int(size)
+    text = size.strip().upper().replace(" ", "")
+    if text and text[-1] in "KMGT":
+        text += "B"
+    for unit in sorted(SIZE_UNITS, key=len, reverse=True):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * SIZE_UNITS[unit])
+    return int(float(text))
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+class Reservation:
+    '''
+    Space held for one download. Bytes already written show up in the volume's free space,
+    so only the part not written yet is held back from other downloads
+    '''
+
+    def __init__(self, device, path: Path, size: int):
+        self.device = device
+        self.path = path  # first existing ancestor of the target, for disk_usage
+        self.size = size
+        self.written = 0
+
+    @property
+    def outstanding(self) -> int:
+        return max(0, self.size - self.written)
+
+    def advance(self, written: int):
+        '''Count bytes written to disk. Only the downloading thread calls this'''
+        self.written += written
+
+
+class DiskManager:
+    '''
+    Reserves free space for downloads before they start and keeps folders under their quotas
+    by evicting the least recently used models
+    '''
+
+    def __init__(self, config: dict, access_file: str):
+        self.quotas = {folder: parse_size(size) for folder, size in config.get("Quota", {}).items()}
+        self.access_file = Path(access_file)
+        self.access_lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.reservations = {}  # device id -> reservations of downloads in flight
+
+    def _device(self, path: Path):
+        # the target may not exist yet, walk up to the first thing that does
+        path = Path(path)
+        while not path.exists():
+            path = path.parent
+        return os.stat(path).st_dev, path
+
+    def _free(self, device, path: Path) -> int:
+        # call with the condition held
+        outstanding = sum(reservation.outstanding for reservation in self.reservations.get(device, ()))
+        return shutil.disk_usage(path).free - outstanding
+
+    def reserve(self, path: Path, size: int):
+        '''
+        Reserve size bytes on the volume holding path. Blocks while other downloads hold
+        the space it needs, returns None if it can never fit
+        '''
+        device, existing = self._device(path)
+        with self.condition:
+            while True:
+                if size <= self._free(device, existing):
+                    reservation = Reservation(device, existing, size)
+                    self.reservations.setdefault(device, []).append(reservation)
+                    return reservation
+                if not self.reservations.get(device):
+                    # nothing in flight on this volume, waiting won't free anything up
+                    return None
+                self.condition.wait()
+
+    def grow(self, reservation: Reservation, size: int) -> bool:
+        '''
+        Raise a reservation to size bytes. Doesn't wait, the caller is usually holding
+        an open response, returns False if the extra space isn't free right now
+        '''
+        with self.condition:
+            extra = size - reservation.size
+            if extra <= 0:
+                return True
+            if extra > self._free(reservation.device, reservation.path):
+                return False
+            reservation.size = size
+            return True
+
+    def release(self, reservation: Reservation):
+        '''Give back a reservation once the download finished or failed'''
+        with self.condition:
+            self.reservations[reservation.device].remove(reservation)
+            self.condition.notify_all()
+
+    def _load_access_times(self) -> dict:
+        if not self.access_file.exists():
+            return {}
+        with open(self.access_file, "r") as f:
+            return json.load(f)
+
+    def record_access(self, path: Path):
+        '''Mark a model as used now'''
+        with self.access_lock:
+            access_times = self._load_access_times()
+            access_times[str(Path(path))] = time.time()
+            with open(self.access_file, "w") as f:
+                json.dump(access_times, f, indent=4)
+
+    def last_access(self, path: Path, access_times: dict) -> float:
+        '''Newest of the recorded access time and the filesystem atime'''
+        return max(access_times.get(str(path), 0), path.stat().st_atime)
+
+    def enforce_quotas(self, folder_paths: dict, dry_run: bool = False, keep: set = None) -> list[tuple]:
+        '''
+        Evict least recently used models from every folder over its quota.
+        folder_paths maps folder name -> path. Files in keep are never evicted.
+        Returns (folder, path, size) for every evicted (or, on dry run, would-be evicted) file
+        '''
+        keep = {str(Path(p)) for p in keep or ()}
+        evicted = []
+        with self.access_lock:
+            access_times = self._load_access_times()
+            for folder, quota in self.quotas.items():
+                base_path = folder_paths.get(folder)
+                if base_path is None or not Path(base_path).exists():
+                    continue
+
+                # hidden files cover .installing staging files, .part downloads in flight don't match an extension
+                files = [
+                    p for p in Path(base_path).rglob("*")
+                    if p.is_file() and not p.name.startswith(".") and p.suffix.lower() in MODEL_EXTENSIONS
+                ]
+                usage = sum(p.stat().st_size for p in files)
+                if usage <= quota:
+                    continue
+
+                files.sort(key=lambda p: self.last_access(p, access_times))  # oldest first
+                for file in files:
+                    if usage <= quota:
+                        break
+                    if str(file) in keep:
+                        continue
+                    size = file.stat().st_size
+                    evicted.append((folder, file, size))
+                    usage -= size
+                    if not dry_run:
+                        file.unlink()
+                        access_times.pop(str(file), None)
+
+                if usage > quota:
+                    print(f"Warning: {folder} is still over its quota ({format_size(usage)} > {format_size(quota)})")
+
+            if not dry_run and evicted:
+                with open(self.access_file, "w") as f:
+                    json.dump(access_times, f, indent=4)
+        return evicted
+
+    def print_eviction_report(self, evicted: list[tuple], dry_run: bool = False):
+        if not evicted:
+            print("Nothing to evict")
+            return
+        verb = "Would evict" if dry_run else "Evicted"
+        for folder, path, size in evicted:
+            print(f"{verb} [{folder}] {path} ({format_size(size)})")
+        print(f"{verb} {len(evicted)} files, {format_size(sum(size for _, _, size in evicted))} total")
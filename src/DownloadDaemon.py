@@ -0,0 +1,247 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from rich.progress import Progress
+from .HtxRequest import HtxRequest
+from .ModelDownloader import ModelDownloader
+from .ModelInfo import ModelInfo
+from .Profiler import PROFILER
+
+if not hasattr(socket, "AF_UNIX"):
+    raise ImportError("The daemon needs unix domain sockets, which this platform doesn't have")
+
+
+class DownloadJob:
+    '''A single submitted download, shared by every submitter asking for the same model'''
+
+    def __init__(self, key: str, url: str, folder: str = None, allow_unsafe: bool = False):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.url = url
+        self.folder = folder
+        self.allow_unsafe = allow_unsafe
+        self.status = "queued"  # queued -> running -> installing -> done | failed
+        self.name = None
+        self.path = None
+        self.download_key = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.finished = threading.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "url": self.url,
+            "folder": self.folder,
+            "status": self.status,
+            "name": self.name,
+            "path": str(self.path) if self.path else None,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    '''One json request per line in, one json response per line out'''
+
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                response = self.server.daemon.handle_request(json.loads(line))
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class DownloadDaemon:
+    '''
+    Long running downloader. Keeps the config, http pools, api cache and worker pool
+    warm and takes jobs over a unix domain socket
+    '''
+
+    def __init__(self, downloader: ModelDownloader, htx: HtxRequest, socket_path: str, concurrent_limit: int = 5, job_retention: float = 3600):
+        self.downloader = downloader
+        self.htx = htx
+        self.socket_path = socket_path
+        self.executor = ThreadPoolExecutor(max_workers=concurrent_limit)
+        self.progress = Progress(disable=True)  # nobody is watching the daemon's terminal
+        self.jobs = {}  # job id -> job
+        self.job_retention = job_retention  # seconds finished jobs stay queryable
+        self.in_flight = {}  # dedup key -> job still queued or running
+        self.active_paths = {}  # resolved download path -> job writing it
+        self.lock = threading.Lock()
+        self.server = None
+
+    def job_key(self, url: str, folder: str = None) -> str:
+        '''Identical requests map to the same key, checked without hitting the api'''
+        model_id = self.htx.parse_url(url)
+        version_id = self.htx.parse_version_id(url)
+        return f"{model_id}:{version_id or 'latest'}:{folder or ''}"
+
+    def submit(self, url: str, folder: str = None, allow_unsafe: bool = False) -> DownloadJob:
+        '''Queue a download, or hand back the in-flight job if the same one is already queued'''
+        key = self.job_key(url, folder)
+        with self.lock:
+            self._prune_jobs()
+            job = self.in_flight.get(key)
+            if job is not None:
+                return job
+            job = DownloadJob(key, url, folder, allow_unsafe)
+            self.jobs[job.id] = job
+            self.in_flight[key] = job
+        self.executor.submit(self._profiled_job, job)
+        return job
+
+    def _prune_jobs(self):
+        '''Forget jobs that finished more than job_retention seconds ago. Call with the lock held'''
+        cutoff = time.time() - self.job_retention
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def _profiled_job(self, job: DownloadJob):
+        '''_run_job wrapped in a profile span, for running on worker threads'''
+        with PROFILER.span("job"):
+            self._run_job(job)
+
+    def _run_job(self, job: DownloadJob):
+        job.status = "running"
+        try:
+            model_info = ModelInfo(self.htx.get_model_by_url(job.url))
+            job.name = model_info.name
+
+            if not model_info.check_virus_scan_passed() and not job.allow_unsafe:
+                raise RuntimeError("virus scan did not pass, resubmit with allow_unsafe to download anyway")
+
+            # can't prompt from the daemon, OTHER models go to temp unless the submitter picked a folder
+            folder = job.folder
+            if folder is None and model_info.type.value == "OTHER":
+                folder = "temp"
+            job.path, folder = self.downloader.resolve_download_path(model_info, force_folder=folder)
+
+            # jobs that differ by url or folder can still land on the same file, only one may write it.
+            # a different version of the same model gets its own file instead
+            job.download_key = model_info.get_download_key()
+            with self.lock:
+                owner = self.active_paths.get(job.path)
+            if owner is not None and owner.download_key != job.download_key:
+                job.path, folder = self.downloader.resolve_download_path(model_info, force_folder=folder, versioned=True)
+            with self.lock:
+                owner = self.active_paths.setdefault(job.path, job)
+            if owner is not job:
+                owner.finished.wait()
+                if owner.status == "failed":
+                    raise RuntimeError(f"job {owner.id} downloading the same file failed: {owner.error}")
+                if not job.path.exists():
+                    raise RuntimeError(f"job {owner.id} finished but {job.path} is gone")
+                job.status = "done"
+                return
+
+            with PROFILER.span("download"):
+                downloaded = self.downloader.download_model(model_info, self.progress, job.path)
+            if not downloaded:
+                raise RuntimeError("download failed")
+            install_future = self.downloader.install_to_targets(model_info, job.path, folder)
+            if install_future is not None:
+                job.status = "installing"
+                install_future.result()
+            job.status = "done"
+            if self.downloader.disk.quotas:
+                # other jobs' files are still being written or waiting on their target installs
+                with self.lock:
+                    keep = set(self.active_paths)
+                self.downloader.enforce_quotas(keep=keep)
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            # drop the path and signal followers together, so no job can claim the path
+            # while this one is done with it but not yet marked finished
+            with self.lock:
+                if self.in_flight.get(job.key) is job:
+                    del self.in_flight[job.key]
+                if job.path is not None and self.active_paths.get(job.path) is job:
+                    del self.active_paths[job.path]
+                job.finished.set()
+
+    def handle_request(self, request: dict) -> dict:
+        action = request.get("action")
+        if action == "submit":
+            job = self.submit(request["url"], request.get("folder"), request.get("allow_unsafe", False))
+            return {"ok": True, **job.to_dict()}
+        if action in ("status", "wait"):
+            job = self.jobs.get(request.get("job_id"))
+            if job is None:
+                return {"ok": False, "error": f"Unknown job: {request.get('job_id')}"}
+            if action == "wait":
+                job.finished.wait(request.get("timeout"))
+            return {"ok": True, **job.to_dict()}
+        if action == "list":
+            with self.lock:
+                self._prune_jobs()
+                jobs = [job.to_dict() for job in self.jobs.values()]
+            return {"ok": True, "jobs": jobs}
+        return {"ok": False, "error": f"Unknown action: {action}"}
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            # only remove it if nothing answers, otherwise it belongs to a running daemon
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                try:
+                    sock.connect(self.socket_path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    pass
+                else:
+                    raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+            os.unlink(self.socket_path)  # stale socket from a previous run
+        self.server = _DaemonServer(self.socket_path, _RequestHandler)
+        self.server.daemon = self
+        print(f"Daemon listening on {self.socket_path}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+class DaemonClient:
+    '''Talks to a running DownloadDaemon over its socket'''
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+
+    def request(self, request: dict) -> dict:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.socket_path)
+            sock.sendall((json.dumps(request) + "\n").encode())
+            with sock.makefile("rb") as f:
+                return json.loads(f.readline())
+
+    def submit(self, url: str, folder: str = None, allow_unsafe: bool = False) -> dict:
+        return self.request({"action": "submit", "url": url, "folder": folder, "allow_unsafe": allow_unsafe})
+
+    def status(self, job_id: str) -> dict:
+        return self.request({"action": "status", "job_id": job_id})
+
+    def wait(self, job_id: str, timeout: float = None) -> dict:
+        return self.request({"action": "wait", "job_id": job_id, "timeout": timeout})
+
+    def list_jobs(self) -> dict:
+        return self.request({"action": "list"})
@@ -2,16 +2,57 @@ import httpx
 import os
 import dotenv
 import json
-from urllib.parse import urlparse
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from .Profiler import PROFILER
 
 dotenv.load_dotenv()
 
 API_KEY = os.getenv("API_KEY")
 
 class HtxRequest:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, cache_ttl: float = 300, cache_size: int = 256):
         self.api_key = api_key
         self.rate_limit = 5 # there's no documentation so i just ball
+        # one pooled client for every api call, keeps connections warm between lookups
+        self.client = httpx.Client(
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            timeout=30.0
+        )
+        # api url -> (fetched at, parsed response), least recently used first.
+        # entries expire so a long running daemon still sees newly published versions
+        self.cache = OrderedDict()
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.cache_lock = threading.Lock()
+
+    def _get_json(self, url: str):
+        '''
+        GET an api url through the shared client. Responses are cached per url for cache_ttl
+        seconds so repeated lookups of the same model don't hit the api again
+        '''
+        with self.cache_lock:
+            entry = self.cache.get(url)
+            if entry is not None:
+                if time.monotonic() - entry[0] < self.cache_ttl:
+                    self.cache.move_to_end(url)
+                    return entry[1]
+                del self.cache[url]
+        with PROFILER.span("api"):
+            response = self.client.get(url)
+            response.raise_for_status()
+            data = response.json()
+        with self.cache_lock:
+            self.cache[url] = (time.monotonic(), data)
+            self.cache.move_to_end(url)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return data
 
     def parse_url(self, url: str):
         try:
@@ -31,15 +72,67 @@ class HtxRequest:
         except Exception as e:
             raise ValueError(f"Error parsing URL: {url} - {str(e)}")
 
+    def parse_version_id(self, url: str):
+        '''
+        Get the modelVersionId query parameter from a model url, None if the url has none
+        '''
+        version_ids = parse_qs(urlparse(url).query).get("modelVersionId")
+        if not version_ids:
+            return None
+        try:
+            return int(version_ids[0])
+        except ValueError:
+            raise ValueError(f"Invalid modelVersionId in URL: {url}")
+
     def get_model(self, model_id: str):
         url = f"https://civitai.com/api/v1/models/{model_id}"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
+        return self._get_json(url)
+
+    def get_model_version(self, version_id: str):
+        '''
+        Get a single model version. Much smaller than the full model document
+        since it doesn't carry every other version and their images
+        '''
+        url = f"https://civitai.com/api/v1/model-versions/{version_id}"
+        return self._get_json(url)
+
+    def get_model_version_by_hash(self, file_hash: str):
+        '''
+        Get the model version a file belongs to by its hash (SHA256, AutoV2, BLAKE3, ...)
+        '''
+        url = f"https://civitai.com/api/v1/model-versions/by-hash/{file_hash}"
+        return self._get_json(url)
+
+    def version_to_model(self, version: dict) -> dict:
+        '''
+        Wrap a model-versions response in the shape of a models response
+        so it can be fed to ModelInfo. The model only carries the one version
+        '''
+        model = version.get("model", {})
+        return {
+            "id": version.get("modelId", ""),
+            "name": model.get("name", ""),
+            "type": model.get("type", ""),
+            "nsfw": model.get("nsfw", False),
+            "modelVersions": [version],
         }
-        response = httpx.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+
+    def get_model_by_url(self, url: str) -> dict:
+        '''
+        Get a model by url. Urls with ?modelVersionId= only fetch that version
+        '''
+        with PROFILER.span("parse_url"):
+            model_id = self.parse_url(url)
+            version_id = self.parse_version_id(url)
+        if version_id is None:
+            return self.get_model(str(model_id))
+        return self.version_to_model(self.get_model_version(str(version_id)))
+
+    def get_model_by_hash(self, file_hash: str) -> dict:
+        '''
+        Get the model version matching a file hash, wrapped as a model
+        '''
+        return self.version_to_model(self.get_model_version_by_hash(file_hash))
 
     def get_models_by_list(self, model_list: list[str]) -> list[dict]:
         '''
@@ -47,9 +140,48 @@ class HtxRequest:
         '''
         models = []
         for model_url in model_list:
-            models.append(self.get_model(self.parse_url(model_url)))
+            models.append(self.get_model_by_url(model_url))
         return models
 
+    def iter_models(self, types: str = None, tag: str = None, username: str = None, limit: int = 100):
+        '''
+        Walk the paginated /models listing page by page, following the cursor.
+        Yields one model dict at a time so the listing never has to fit in memory
+        '''
+        url = "https://civitai.com/api/v1/models"
+        params = {"limit": limit}
+        if types:
+            params["types"] = types
+        if tag:
+            params["tag"] = tag
+        if username:
+            params["username"] = username
+
+        while True:
+            # pages aren't cached, the listing is only walked once
+            with PROFILER.span("api"):
+                response = self.client.get(url, params=params)
+                response.raise_for_status()
+                page = response.json()
+            yield from page.get("items", [])
+
+            cursor = page.get("metadata", {}).get("nextCursor")
+            if not cursor:
+                break
+            params["cursor"] = cursor
+
+    def export_catalog(self, output_file: str, types: str = None, tag: str = None, username: str = None) -> int:
+        '''
+        Stream the filtered model listing to a JSONL file, one model per line.
+        Returns the number of models written
+        '''
+        count = 0
+        with open(output_file, "w") as file:
+            for model in self.iter_models(types=types, tag=tag, username=username):
+                file.write(json.dumps(model) + "\n")
+                count += 1
+        return count
+
     def get_models_by_list_file(self, model_list_file: str) -> list[dict]:
         '''
         Get models by list of urls from file. 
@@ -0,0 +1,106 @@
+import errno
+import os
+import shutil
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+FICLONE = 0x40049409  # linux ioctl, same on btrfs and xfs
+INSTALL_METHODS = ["reflink", "hardlink", "symlink", "copy"]
+
+# errors that mean "this filesystem can't do it", move on to the next method on these
+_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM, errno.ENOSYS}
+# what to try on the same filesystem when a method isn't supported, cheapest first. copying is
+# only for different filesystems, on the same one it would just duplicate the file
+_SAME_DEVICE_FALLBACKS = {
+    "reflink": ["reflink", "hardlink", "symlink"],
+    "hardlink": ["hardlink", "symlink"],
+    "symlink": ["symlink"],
+    "copy": ["copy"],
+}
+
+
+def _reflink(source: Path, destination: Path):
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink not supported on this platform")
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source, destination)
+
+
+def _remove(path: Path):
+    if path.exists() or path.is_symlink():
+        path.unlink()
+
+
+def _copy(source: Path, destination: Path, disk=None):
+    # a copy takes real space on the target volume, get it admitted like a download
+    reservation = None
+    if disk is not None:
+        reservation = disk.reserve(destination, source.stat().st_size)
+        if reservation is None:
+            raise OSError(errno.ENOSPC, f"Not enough free space to copy to {destination.parent}")
+    try:
+        shutil.copy2(source, destination)
+    finally:
+        if reservation is not None:
+            disk.release(reservation)
+
+
+def _materialise(method: str, source: Path, staging: Path, disk=None):
+    if method == "reflink":
+        _reflink(source, staging)
+    elif method == "hardlink":
+        os.link(source, staging)
+    elif method == "symlink":
+        os.symlink(source.resolve(), staging)
+    else:
+        _copy(source, staging, disk)
+
+
+def install_file(source: Path, destination: Path, method: str = "reflink", disk=None) -> str:
+    '''
+    Materialise source at destination with the given method, replacing whatever is there.
+    On the same filesystem an unsupported reflink falls back to a hardlink, then a symlink.
+    reflink and hardlink only fall back to copying across filesystems. Copies reserve their
+    space with disk (a DiskManager) when given. Returns the method actually used
+    '''
+    if method not in INSTALL_METHODS:
+        raise ValueError(f"Unknown install method: {method}. Must be one of {', '.join(INSTALL_METHODS)}")
+
+    source = Path(source)
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    # build next to the destination and swap it in, so a half written file never shows up under the real name
+    staging = destination.with_name(f".{destination.name}.installing")
+    _remove(staging)
+
+    same_device = source.stat().st_dev == destination.parent.stat().st_dev
+    if same_device or method in ("symlink", "copy"):
+        attempts = _SAME_DEVICE_FALLBACKS[method]
+    else:
+        attempts = ["copy"]  # reflinks and hardlinks can't cross filesystems
+
+    try:
+        for attempt in attempts:
+            try:
+                _materialise(attempt, source, staging, disk)
+                method = attempt
+                break
+            except OSError as e:
+                _remove(staging)
+                if e.errno == errno.EXDEV:
+                    # same st_dev but still a different filesystem (bind mounts, btrfs subvolumes)
+                    _copy(source, staging, disk)
+                    method = "copy"
+                    break
+                if attempt == attempts[-1] or e.errno not in _UNSUPPORTED:
+                    raise
+        os.replace(staging, destination)
+    except BaseException:
+        _remove(staging)  # don't leave a partial copy behind, e.g. on ENOSPC
+        raise
+    return method
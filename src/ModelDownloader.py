@@ -1,5 +1,6 @@
 import tomllib as toml
 import os
+import threading
 import httpx
 import dotenv
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -8,6 +9,9 @@ from rich.progress import Progress
 from .HtxRequest import HtxRequest
 from .ModelInfo import ModelInfo
 from .CliHelpers import CliHelpers
+from .DiskManager import DiskManager
+from .Profiler import PROFILER
+from .Installer import install_file, INSTALL_METHODS
 from pathlib import Path
 
 CONFIG_PATH = f"{__file__}/../config.toml" #uggo hack i hate paths
@@ -21,16 +25,33 @@ class ModelDownloader:
             self.config = toml.load(f)
         self.paths = self.get_folder_paths()
         self.cli_helpers = CliHelpers()
-        self.final_file_paths = {}  # Store final paths for models
+        self.final_file_paths = {}  # Store final paths for models, keyed by ModelInfo.get_download_key()
         self.api_key = os.getenv("API_KEY")  # Get API key for downloads
+        # pooled client shared by all download threads
+        self.client = httpx.Client(timeout=30.0, follow_redirects=True)
+        self.disk = DiskManager(self.config, Path(config_file).parent / "access_times.json")
+        self.final_folders = {}  # download key -> folder name it was downloaded into
+        self.targets = self.get_targets()
+        self.install_method = self.config.get("Install", {}).get("method", "reflink")
+        if self.install_method not in INSTALL_METHODS:
+            raise ValueError(f"Invalid install method '{self.install_method}' in config. Must be one of {', '.join(INSTALL_METHODS)}")
+        # installs into the extra targets run here while the download workers move on
+        self.install_executor = ThreadPoolExecutor(max_workers=2)
+        # sources queued or being installed, quota eviction must leave them alone
+        self.pending_installs = set()
+        self.pending_installs_lock = threading.Lock()
 
-    def get_folder_paths(self) -> dict:
-        if self.config["Override"]["override"]:
+    def get_folder_paths(self, models_path: str = None, override: dict = None) -> dict:
+        """Folder paths for the main install, or for the given models path and override section"""
+        if models_path is None:
+            models_path = self.config["ComfyUI"]["comfyui_models_path"]
+            override = self.config["Override"]
+        if override and override.get("override"):
             # If 'override' is true, return paths directly from the 'Override' section.
-            return {key: self.config["Override"][key] for key in self.config["Override"] if key != "override"}
+            return {key: override[key] for key in override if key != "override"}
         else:
             # If 'override' is false, construct paths using the base path and a list of subfolders.
-            base_path = self.config["ComfyUI"]["comfyui_models_path"]
+            base_path = models_path
             subfolders = [
                 "checkpoints",
                 "clip",
@@ -53,21 +74,94 @@ class ModelDownloader:
             return {f"{folder}_path": f"{base_path}/{folder}" for folder in subfolders}
 
 
+    def get_targets(self) -> dict:
+        """Extra ComfyUI installs from [Targets.<name>] that downloads get installed into"""
+        targets = {}
+        for name, target in self.config.get("Targets", {}).items():
+            models_path = target["comfyui_models_path"]
+            targets[name] = {
+                "models_path": models_path,
+                "paths": self.get_folder_paths(models_path, target.get("Override")),
+            }
+        return targets
+
+    def folder_path(self, folder: str, target: str = None) -> Path:
+        """Resolve a folder name (loras, temp, ...) to its path in the main install or the named target"""
+        if target is None:
+            models_path, paths = self.config["ComfyUI"]["comfyui_models_path"], self.paths
+        else:
+            models_path, paths = self.targets[target]["models_path"], self.targets[target]["paths"]
+        if folder == "temp":
+            return Path(models_path) / "temp"
+        folder_path_key = f"{folder}_path"
+        if folder_path_key in paths:
+            return Path(paths[folder_path_key])
+        return Path(models_path) / folder
+
+    def enforce_quotas(self, dry_run: bool = False, keep: set = None) -> list[tuple]:
+        """
+        Evict least recently used models from folders over their quota and report what went.
+        Evicted models are removed from every target too, hardlinked or copied target files
+        would otherwise keep the space in use
+        """
+        folder_paths = {folder: self.folder_path(folder) for folder in self.disk.quotas}
+        keep = set(keep or ()) | self.protected_paths()
+        # inodes of the candidates before they're deleted, to tell hardlinked target files from copies
+        candidates = self.disk.enforce_quotas(folder_paths, dry_run=True, keep=keep) if self.targets else []
+        inodes = {str(path): path.stat().st_ino for _, path, _ in candidates}
+        evicted = self.disk.enforce_quotas(folder_paths, dry_run=dry_run, keep=keep)
+        evicted += self._evict_from_targets(evicted, inodes, dry_run)
+        self.disk.print_eviction_report(evicted, dry_run=dry_run)
+        return evicted
+
+    def _evict_from_targets(self, evicted: list[tuple], inodes: dict, dry_run: bool) -> list[tuple]:
+        """
+        Remove the target installs of evicted models, returns them in the same (folder, path, size) shape.
+        inodes maps evicted paths to their inode so hardlinks to them aren't counted twice
+        """
+        removed = []
+        for folder, path, _ in evicted:
+            relative_path = Path(path).relative_to(self.folder_path(folder))
+            source_inode = inodes.get(str(path))
+            for target in self.targets:
+                target_path = self.folder_path(folder, target) / relative_path
+                if not (target_path.exists() or target_path.is_symlink()):
+                    continue
+                # symlinks and hardlinks to the evicted file free nothing extra, only copies count
+                stat = target_path.lstat()
+                size = 0 if target_path.is_symlink() or stat.st_ino == source_inode else stat.st_size
+                removed.append((f"{target}/{folder}", target_path, size))
+                if not dry_run:
+                    target_path.unlink()
+        return removed
+
     def set_download_path(self, model_info: ModelInfo, force_folder: str = None):
         """
         Set the download path for a model. If force_folder is specified, use that folder.
         For OTHER type models, prompt user for folder choice if not specified.
         """
+        download_path, folder = self.resolve_download_path(model_info, force_folder)
+        
+        # another version of the same model in this batch already has that name
+        claimed_by = {path: key for key, path in self.final_file_paths.items()}.get(download_path)
+        if claimed_by is not None and claimed_by != model_info.get_download_key():
+            download_path, folder = self.resolve_download_path(model_info, force_folder, versioned=True)
+        
+        # Store the final path for this model
+        self.final_file_paths[model_info.get_download_key()] = download_path
+        self.final_folders[model_info.get_download_key()] = folder
+        
+        return download_path
+
+    def resolve_download_path(self, model_info: ModelInfo, force_folder: str = None, versioned: bool = False) -> tuple[Path, str]:
+        """
+        Work out (download path, folder name) for a model without storing it.
+        versioned adds the version id to the file name, for when another version already has the plain name
+        """
         # If a specific folder is forced, use it
         if force_folder:
-            if force_folder == "temp":
-                base_path = Path(self.config["ComfyUI"]["comfyui_models_path"]) / "temp"
-            else:
-                folder_path_key = f"{force_folder}_path"
-                if folder_path_key in self.paths:
-                    base_path = Path(self.paths[folder_path_key])
-                else:
-                    base_path = Path(self.config["ComfyUI"]["comfyui_models_path"]) / force_folder
+            base_path = self.folder_path(force_folder)
+            folder = force_folder
         else:
             # Normal folder detection logic
             model_type_str = model_info.type.value.lower()
@@ -92,12 +186,17 @@ class ModelDownloader:
                 base_path = Path(self.paths[path_key])
             else:
                 base_path = Path(self.config["ComfyUI"]["comfyui_models_path"]) / matching_subfolder
+            folder = matching_subfolder
         
         # Ensure the base path directory exists
         base_path.mkdir(parents=True, exist_ok=True)
         
         safe_name = model_info.name.replace(' ', '_').replace('/', '_').replace('\\', '_')
         
+        version_id = model_info.get_latest_version_id()
+        if versioned and version_id:
+            safe_name = f"{safe_name}_{version_id}"
+        
         # Get the file extension from the model version
         file_extension = model_info.get_latest_file_extension()
         if file_extension:
@@ -105,10 +204,46 @@ class ModelDownloader:
         
         download_path = Path(base_path) / safe_name
         
-        # Store the final path for this model
-        self.final_file_paths[model_info.id] = download_path
-        
-        return download_path
+        return download_path, folder
+
+    def install_to_targets(self, model_info: ModelInfo, source: Path = None, folder: str = None):
+        """
+        Queue installing a downloaded model into every extra target. Runs on the install pool
+        so the next download doesn't wait for it. Returns the future, None without targets.
+        source/folder default to what set_download_path stored for the model
+        """
+        if not self.targets:
+            return None
+        if source is None:
+            source = self.final_file_paths[model_info.get_download_key()]
+            folder = self.final_folders[model_info.get_download_key()]
+        with self.pending_installs_lock:
+            self.pending_installs.add(source)
+        future = self.install_executor.submit(self._install, model_info, source, folder)
+        future.add_done_callback(lambda _: self._install_done(source))
+        return future
+
+    def _install_done(self, source: Path):
+        with self.pending_installs_lock:
+            self.pending_installs.discard(source)
+
+    def protected_paths(self) -> set:
+        """Files quota eviction must not touch right now, the sources of pending installs"""
+        with self.pending_installs_lock:
+            return set(self.pending_installs)
+
+    def _install(self, model_info: ModelInfo, source: Path, folder: str) -> list[tuple]:
+        installed = []
+        for target in self.targets:
+            destination = self.folder_path(folder, target) / source.name
+            try:
+                with PROFILER.span("install"):
+                    method = install_file(source, destination, self.install_method, self.disk)
+                print(f"Installed {model_info.name} into {target} ({method}) at {destination}")
+                installed.append((target, destination, method))
+            except Exception as e:
+                print(f"Error installing {model_info.name} into {target}: {e}")
+        return installed
 
     def prompt_for_other_type_folder(self, model_info: ModelInfo) -> str:
         """Prompt user for folder choice for OTHER type models and return chosen folder"""
@@ -131,21 +266,35 @@ class ModelDownloader:
         
         return chosen_folder
 
-    def download_model(self, model_info, progress: Progress):
-        """Download a model to its appropriate folder"""
+    def download_model(self, model_info, progress: Progress, download_path: Path = None):
+        """Download a model to download_path, or to the path set_download_path stored for it"""
         download_url = model_info.get_latest_download_url()
         if not download_url:
             print(f"No download URL found for model: {model_info.name}")
             return False
 
         # Get the download path
-        download_path = self.final_file_paths.get(model_info.id)
+        if download_path is None:
+            download_path = self.final_file_paths.get(model_info.get_download_key())
         if download_path is None:
             print(f"Error: Download path not set for {model_info.name}. Call set_download_path first.")
             return False
 
         download_path.parent.mkdir(parents=True, exist_ok=True)
 
+        # hold the space before starting so a full volume fails up front instead of halfway through.
+        # without a reported sizeKB this reserves nothing and content-length tops it up below
+        reserved_size = model_info.get_latest_file_size() or 0
+        with PROFILER.span("disk_admission"):
+            reservation = self.disk.reserve(download_path, reserved_size)
+        if reservation is None:
+            print(f"Not enough free space for {model_info.name} ({reserved_size} bytes) at {download_path.parent}")
+            return False
+
+        # write next to the final path and swap in at the end, so a re-download never truncates
+        # the old file in place (hardlinked targets share it) and never leaves a partial under the real name
+        part_path = download_path.with_name(f"{download_path.name}.part")
+        success = False
         try:
             print(f"Downloading {model_info.name} to {download_path}")
             headers = {
@@ -153,18 +302,26 @@ class ModelDownloader:
                 "User-Agent": "CivitAI-CLI-Downloader/1.0"
             }
 
-            with httpx.stream("GET", download_url, headers=headers, timeout=30.0, follow_redirects=True) as response:
+            with self.client.stream("GET", download_url, headers=headers) as response:
                 response.raise_for_status()
                 total_size = int(response.headers.get("content-length", 0))
+                if not self.disk.grow(reservation, total_size):
+                    print(f"Not enough free space for {model_info.name} ({total_size} bytes) at {download_path.parent}")
+                    return False
 
                 task_id = progress.add_task(f"[cyan]Downloading {model_info.name}", total=total_size)
 
-                with open(download_path, "wb") as f:
-                    for chunk in response.iter_bytes(chunk_size=8192):
-                        f.write(chunk)
+                with open(part_path, "wb") as f:
+                    for chunk in PROFILER.timed_iter("network", response.iter_bytes(chunk_size=8192)):
+                        with PROFILER.span("disk_write"):
+                            f.write(chunk)
+                        reservation.advance(len(chunk))
                         progress.update(task_id, advance=len(chunk))
+                os.replace(part_path, download_path)
 
             print(f"Downloaded {model_info.name} successfully to {download_path}")
+            self.disk.record_access(download_path)
+            success = True
             return True
 
         except httpx.HTTPStatusError as e:
@@ -176,6 +333,15 @@ class ModelDownloader:
         except Exception as e:
             print(f"Error downloading {model_info.name}: {e}")
             return False
+        finally:
+            self.disk.release(reservation)
+            if not success and part_path.exists():
+                part_path.unlink()  # don't leave truncated files behind
+
+    def _profiled_download(self, model_info, progress: Progress):
+        """download_model wrapped in a profile span, for running on worker threads"""
+        with PROFILER.span("download"):
+            return self.download_model(model_info, progress)
 
     def download_concurrently(self, model_list: list[ModelInfo], concurrent_limit: int = 5):
         """Download multiple models concurrently with virus scan checks and user confirmation"""
@@ -184,16 +350,17 @@ class ModelDownloader:
             return
         
         safe_models, unsafe_models = [], []
-        for model in model_list:
-            if model.check_virus_scan_passed():
-                safe_models.append(model)
-            else:
-                latest_version = model.get_latest_version()
-                if latest_version and latest_version.get("files"):
-                    scan_result = latest_version["files"][0].get("virusScanResult", "Unknown")
-                    unsafe_models.append((model, scan_result))
+        with PROFILER.span("virus_scan"):
+            for model in model_list:
+                if model.check_virus_scan_passed():
+                    safe_models.append(model)
                 else:
-                    print(f"Skipping {model.name} - no virus scan information available")
+                    latest_version = model.get_latest_version()
+                    if latest_version and latest_version.get("files"):
+                        scan_result = latest_version["files"][0].get("virusScanResult", "Unknown")
+                        unsafe_models.append((model, scan_result))
+                    else:
+                        print(f"Skipping {model.name} - no virus scan information available")
 
         if unsafe_models:
             confirmed_unsafe = self.cli_helpers.confirm_multiple_unsafe_models(unsafe_models)
@@ -209,19 +376,29 @@ class ModelDownloader:
         for model in all_models_to_download:
             if model.type.value == "OTHER":
                 chosen_folder = self.prompt_for_other_type_folder(model)
-                self.set_download_path(model, force_folder=chosen_folder)
+                with PROFILER.span("set_download_path"):
+                    self.set_download_path(model, force_folder=chosen_folder)
             else:
-                self.set_download_path(model)
+                with PROFILER.span("set_download_path"):
+                    self.set_download_path(model)
+
+        # the same file listed twice would have two workers writing one .part file
+        unique_models = {}
+        for model in all_models_to_download:
+            unique_models.setdefault(self.final_file_paths[model.get_download_key()], model)
+        all_models_to_download = list(unique_models.values())
 
         print(f"Downloading {len(all_models_to_download)} models concurrently (limit: {concurrent_limit})")
 
         successful_downloads = 0
         failed_downloads = 0
+        downloaded_paths = set()
+        install_futures = []
 
         with Progress() as progress:
             with ThreadPoolExecutor(max_workers=concurrent_limit) as executor:
                 future_to_model = {
-                    executor.submit(self.download_model, model, progress): model
+                    executor.submit(self._profiled_download, model, progress): model
                     for model in all_models_to_download
                 }
 
@@ -231,14 +408,26 @@ class ModelDownloader:
                         success = future.result()
                         if success:
                             successful_downloads += 1
+                            downloaded_paths.add(self.final_file_paths[model.get_download_key()])
+                            install_future = self.install_to_targets(model)
+                            if install_future is not None:
+                                install_futures.append(install_future)
                         else:
                             failed_downloads += 1
                     except Exception as e:
                         print(f"Error downloading {model.name}: {e}")
                         failed_downloads += 1
 
+        if install_futures:
+            print(f"Waiting for installs into {len(self.targets)} extra target(s) to finish")
+            for future in install_futures:
+                future.result()
+
         print(f"\nDownload summary: {successful_downloads} successful, {failed_downloads} failed")
 
+        if self.disk.quotas and downloaded_paths:
+            self.enforce_quotas(keep=downloaded_paths)
+
     def download_single_model(self, model_info: ModelInfo) -> bool:
         """Download a single model with virus scan confirmation if needed"""
         if model_info.check_virus_scan_passed():
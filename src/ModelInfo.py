@@ -91,6 +91,10 @@ class ModelInfo:
         latest = self.get_latest_version()
         return str(latest.get("id")) if latest else None
     
+    def get_download_key(self) -> str:
+        """Key for the file this model downloads, the version id (unique across models) or the model id without one"""
+        return self.get_latest_version_id() or self.id
+    
     def get_latest_file_extension(self) -> Optional[str]:
         """Get the file extension from the latest version file"""
         latest = self.get_latest_version()
@@ -101,6 +105,15 @@ class ModelInfo:
                     return file_name.split(".")[-1]
         return None
     
+    def get_latest_file_size(self) -> Optional[int]:
+        """Get the size in bytes of the latest version file, from the reported sizeKB"""
+        latest = self.get_latest_version()
+        if latest and latest.get("files"):
+            size_kb = latest["files"][0].get("sizeKB")
+            if size_kb:
+                return int(size_kb * 1024)
+        return None
+    
     def get_version_file_extension(self, version_id: str) -> Optional[str]:
         """Get the file extension from a specific version file"""
         version = self.get_version_by_id(version_id)
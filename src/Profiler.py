@@ -0,0 +1,141 @@
+import cProfile
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from pathlib import Path
+
+_NO_SPAN = nullcontext()  # handed out while profiling is off so spans cost one attribute check
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    '''
+    Per phase timing for a run. Off by default, spans are no-ops until start() is called.
+    Times from worker threads are summed, so parallel phases can add up past the wall time.
+    The cProfile dump only covers the main thread: python 3.12 allows one active profiler
+    and it doesn't see other threads, so worker threads only show up in the phase timings
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.output_dir = None
+        self.lock = threading.Lock()
+        self.phases = {}  # phase name -> [calls, total seconds, max seconds]
+        self.started_at = None
+        self.cprofile = None
+        self.tracemalloc = False
+
+    def start(self, output_dir: str, cprofile: bool = False, trace_memory: bool = False):
+        self.output_dir = Path(output_dir)
+        self.phases = {}
+        if cprofile:
+            self.cprofile = cProfile.Profile()
+            try:
+                self.cprofile.enable()
+            except ValueError as e:
+                # another profiler (debugger, coverage, ...) already holds the slot, carry on without
+                print(f"Warning: cProfile unavailable, skipping it: {e}")
+                self.cprofile = None
+        if trace_memory:
+            self.tracemalloc = True
+            tracemalloc.start()
+        self.started_at = time.perf_counter()
+        self.enabled = True
+
+    def span(self, name: str):
+        '''Time a block under a phase name'''
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name)
+
+    def timed_iter(self, name: str, iterable):
+        '''Time how long each next() on iterable takes, for phases that are a loop like network reads'''
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(name, iterable)
+
+    def _timed_iter(self, name: str, iterable):
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+    def add(self, name: str, seconds: float):
+        with self.lock:
+            phase = self.phases.get(name)
+            if phase is None:
+                self.phases[name] = [1, seconds, seconds]
+            else:
+                phase[0] += 1
+                phase[1] += seconds
+                phase[2] = max(phase[2], seconds)
+
+    def stop(self):
+        '''Stop profiling and write the phase breakdown and raw profiles to the output dir'''
+        if not self.enabled:
+            return
+        self.enabled = False
+        wall_time = time.perf_counter() - self.started_at
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            pstats.Stats(self.cprofile).dump_stats(self.output_dir / "cprofile.prof")
+            self.cprofile = None
+
+        top_allocations = []
+        if self.tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self.tracemalloc = False
+            snapshot.dump(str(self.output_dir / "tracemalloc.snapshot"))
+            top_allocations = [str(stat) for stat in snapshot.statistics("lineno")[:25]]
+
+        report = {
+            "wall_seconds": wall_time,
+            "phases": {
+                name: {"calls": calls, "total_seconds": total, "mean_seconds": total / calls, "max_seconds": longest}
+                for name, (calls, total, longest) in sorted(self.phases.items(), key=lambda item: -item[1][1])
+            },
+            "top_allocations": top_allocations,
+        }
+        with open(self.output_dir / "phases.json", "w") as f:
+            json.dump(report, f, indent=4)
+
+        lines = [f"wall time: {wall_time:.3f}s", "", f"{'phase':<20}{'calls':>8}{'total s':>12}{'mean s':>12}{'max s':>12}"]
+        for name, phase in report["phases"].items():
+            lines.append(f"{name:<20}{phase['calls']:>8}{phase['total_seconds']:>12.3f}{phase['mean_seconds']:>12.4f}{phase['max_seconds']:>12.3f}")
+        if top_allocations:
+            lines += ["", "top allocations:"] + top_allocations
+        with open(self.output_dir / "phases.txt", "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+        print("\n" + "\n".join(lines[:len(report["phases"]) + 3]))
+        print(f"\nProfile written to {self.output_dir}")
+
+
+PROFILER = Profiler()  # shared by every module, enabled by --profile